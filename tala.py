@@ -1,7 +1,20 @@
 import streamlit as st
 import pandas as pd
-from pulp import LpProblem, LpVariable, LpBinary, lpSum, LpMinimize, PULP_CBC_CMD
-import io, csv, time
+import numpy as np
+import altair as alt
+from pulp import LpProblem, LpVariable, LpBinary, lpSum, LpMinimize, LpStatus, LpStatusOptimal, PULP_CBC_CMD, HiGHS, GUROBI_CMD, PulpSolverError
+import io, os, time
+from collections import defaultdict
+try:
+    import numba
+    from numba import njit, prange
+    # Streamlit runs the script off the main thread, where a TBB-backed parallel
+    # kernel keeps the process from exiting; prefer OpenMP when it is available
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+except ImportError:  # numba is optional; jitted helpers then run as plain NumPy
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda f: f
 
 # This version merges all profile forms under a single "School Profile" tab,
 # caches solver output for faster reruns, displays schedule generation time,
@@ -23,83 +36,284 @@ shift_period_ranges = {
     2: [(0, 4), (5, 9)],
     3: [(0, 2), (3, 6), (7, 9)],
 }
+# ILP backends selectable in the Constraints tab; unavailable ones fall back to CBC
+solvers = {"HiGHS": HiGHS, "CBC": PULP_CBC_CMD, "Gurobi": GUROBI_CMD}
+# SRI & Simulation tab text
+sri_caption = "SRI weights: Specialist 40%, Teacher Overload 20%, Room Overload 20%, Unmet Sections 20% (adjustable in code)"
+model_caption = "Model: Based on Orbeta (2020), World Bank (2016), OECD TALIS (2019), PIDS (2019). See app code for details."
+narrative_template = """
+**Simulation Narrative:**
+- **Class size:** For every 5 students above 45, average NAT scores decrease by 1.5 points (Project STAR, World Bank 2016).
+- **Specialization:** Each 10% increase in non-specialist assignments reduces scores by 3 points (Orbeta et al., PIDS 2020).
+- **Teacher overload:** Every 5% increase in overloaded teachers reduces scores by 0.5 points (OECD TALIS, DepEd).
+- **Shifting:** Each shift beyond single reduces NAT by 2 points (PIDS 2019).
+
+**Your scenario:**
+- Average class size: {class_size}
+- % Non-specialist assignments: {pct_nonspec}
+- % Overloaded teachers: {pct_overload}
+- Number of shifts: {n_shifts}
+
+**Interpretation:**
+- Increasing class size, non-specialist assignments, teacher overload, or number of shifts will lower the predicted NAT score, based on cited research. Adjust these parameters to see their impact and guide school planning decisions.
+"""
 
 # ----------------------------
 # 2. SCHEDULER FUNCTION
 # ----------------------------
+def make_solver(name, threads=None, time_limit=60, gap_rel=0.01, warm_start=False):
+    opts = dict(msg=False, timeLimit=time_limit, gapRel=gap_rel)
+    threads = threads or os.cpu_count()
+    if name == "HiGHS":
+        # In-process HiGHS fixes its thread pool on the first solve and reports
+        # "Not Solved" for any later solve asking for a different count, so the
+        # thread count is left to HiGHS; its interface does not take a MIP start either
+        solver = HiGHS(**opts)
+        if solver.available():
+            return solver
+    elif name == "Gurobi":
+        solver = GUROBI_CMD(threads=threads, warmStart=warm_start, **opts)
+        if solver.available():
+            return solver
+    return PULP_CBC_CMD(presolve=True, cuts=True, threads=threads, warmStart=warm_start, **opts)
+
+def normalize_inputs(teachers_df, rooms_df, classes_df):
+    # Canonical, id-sorted tuples so that row reordering or dtype drift after edits
+    # still hits the solve_with_pulp cache
+    teachers = tuple(sorted((str(tid), str(maj), str(min_)) for tid, maj, min_ in teachers_df[["id","major","minor"]].itertuples(index=False, name=None)))
+    # Room ids are deduplicated: the model treats each entry as a distinct room
+    rooms = tuple(sorted({str(rid) for rid in rooms_df['id']}))
+    classes = tuple(sorted((str(cid), str(subj), int(times), int(dur)) for cid, subj, times, dur in classes_df[["id","subject","times_per_week","duration"]].itertuples(index=False, name=None)))
+    return teachers, rooms, classes
+
+def trivial_infeasibilities(teachers, rooms, classes, max_per_week, num_shifts):
+    """
+    Cheap counting checks that prove a problem infeasible without calling the solver.
+    Returns a list of human-readable reasons (empty if none were found).
+    """
+    reasons = []
+    # Periods are counted with durations for teacher loads, as in the model
+    required = sum(int(times) * int(dur) for _, _, times, dur in classes)
+    teacher_capacity = len(teachers) * max_per_week
+    if required > teacher_capacity:
+        reasons.append(f"Classes need {required} teacher-periods per week but {len(teachers)} teachers at {max_per_week} periods each provide only {teacher_capacity}.")
+    slots = len(days) * sum(end - start + 1 for start, end in shift_period_ranges[num_shifts])
+    meetings = sum(int(times) for _, _, times, _ in classes)
+    if meetings > len(rooms) * slots:
+        reasons.append(f"Classes meet {meetings} times per week but {len(rooms)} rooms offer only {len(rooms) * slots} room-periods.")
+    demand = defaultdict(int)
+    for _, subj, times, dur in classes:
+        demand[subj] += int(times) * int(dur)
+    for subj, need in demand.items():
+        if need == 0:
+            continue
+        qualified = sum(1 for _, maj, min_ in teachers if subj in (maj, min_))
+        if qualified == 0:
+            reasons.append(f"No teacher has {subj} as a major or minor.")
+        elif need > qualified * max_per_week:
+            reasons.append(f"{subj} needs {need} periods per week but its {qualified} qualified teachers can cover only {qualified * max_per_week}.")
+    return reasons
+
+def _greedy_assign(teachers, rooms, classes, max_per_day, max_per_week, allowed_periods, spread_week=True):
+    """
+    Place each class meeting in the first slot that has a free room and a free,
+    qualified teacher (majors tried before minors), respecting the same load and
+    per-day limits as the model (including the even-spread cap when spread_week
+    is set). Returns {(t, c, d, p): 1} keyed like the variables in
+    solve_with_pulp, or None if some meeting could not be placed.
+    """
+    class_subject = {cid: subj for cid, subj, _, _ in classes}
+    class_times = {cid: int(times) for cid, _, times, _ in classes}
+    class_duration = {cid: int(dur) for cid, _, _, dur in classes}
+    qualifications = {tid: {"major": {maj}, "minor": {min_}} for tid, maj, min_ in teachers}
+    teacher_ids = list(qualifications)
+    busy = set()                 # (teacher, day, period)
+    slot_use = defaultdict(int)  # (day, period) -> classes placed
+    day_load = defaultdict(int)  # (teacher, day) -> periods
+    week_load = defaultdict(int) # teacher -> periods
+    assignment = {}
+    for ci, cid in enumerate(class_subject):
+        subj, dur = class_subject[cid], class_duration[cid]
+        per_day = -(-class_times[cid] // len(days)) if spread_week else class_times[cid]
+        candidates = ([ti for ti, tid in enumerate(teacher_ids) if subj in qualifications[tid]["major"]] +
+                      [ti for ti, tid in enumerate(teacher_ids) if subj not in qualifications[tid]["major"] and subj in qualifications[tid]["minor"]])
+        class_day = defaultdict(int)
+        for _ in range(class_times[cid]):
+            slot = next(((ti, di, pi)
+                         for di in range(len(days)) if class_day[di] < per_day
+                         for pi in allowed_periods if slot_use[(di, pi)] < len(rooms)
+                         for ti in candidates
+                         if (ti, di, pi) not in busy
+                         and day_load[(ti, di)] + dur <= max_per_day
+                         and week_load[ti] + dur <= max_per_week), None)
+            if slot is None:
+                return None
+            ti, di, pi = slot
+            assignment[(ti, ci, di, pi)] = 1
+            busy.add(slot)
+            slot_use[(di, pi)] += 1
+            day_load[(ti, di)] += dur
+            week_load[ti] += dur
+            class_day[di] += 1
+    return assignment
+
 @st.cache_data(show_spinner=False)
-def solve_with_pulp(teachers, rooms, classes, max_per_day, max_per_week, num_shifts):
+def solve_with_pulp(teachers, rooms, classes, max_per_day, max_per_week, num_shifts, solver_name="HiGHS", threads=None, time_limit=60, gap_rel=0.01, spread_week=True):
     # classes: list of (id, subject, times_per_week, duration)
     class_subject = {cid: subj for cid, subj, _, _ in classes}
     class_times = {cid: int(times) for cid, _, times, _ in classes}
     class_duration = {cid: int(dur) for cid, _, _, dur in classes}
     qualifications = {tid: {"major": {maj}, "minor": {min_}} for tid, maj, min_ in teachers}
+    # Skip building and solving the model when counting alone shows it is infeasible
+    reasons = trivial_infeasibilities(teachers, rooms, classes, max_per_week, num_shifts)
+    if reasons:
+        sched = pd.DataFrame()
+        sched.attrs["infeasible"] = reasons
+        return sched
+    # The model works on integer indices into these lists (and days/periods);
+    # ids are decoded back to strings only when building the output
+    teacher_ids = list(qualifications)
+    class_ids = list(class_subject)
     model = LpProblem("Class_Scheduler", LpMinimize)
     x = {}
-    # Only allow assignments in periods allowed by shift
-    allowed_periods = set()
-    for rng in shift_period_ranges[num_shifts]:
-        allowed_periods.update(periods[i] for i in range(rng[0], rng[1]+1))
-    # Decision variables: for each instance of a class (times per week), for each period in the day
-    for tid, _, _ in teachers:
-        for cid, _, times, dur in classes:
+    # Only allow assignments in periods allowed by shift (deduplicated, in period order)
+    allowed_periods = list(dict.fromkeys(
+        i for rng in shift_period_ranges[num_shifts] for i in range(rng[0], rng[1]+1)))
+    day_range = range(len(days))
+    # Decision variables: whether a teacher takes a class in a given day and period.
+    # Occurrences of a class are interchangeable, so they are not indexed separately;
+    # that would only multiply equivalent solutions for the solver to wade through.
+    # Rooms are interchangeable too, so they are left out of the model and assigned after solving.
+    # Variables are also bucketed by the keys each constraint groups on, so every lpSum
+    # below reads only its own bucket instead of scanning all of x.
+    by_c = defaultdict(list)    # class -> vars
+    by_cd = defaultdict(list)   # (class, day) -> vars
+    by_tdp = defaultdict(list)  # (teacher, day, period) -> vars
+    by_dp = defaultdict(list)   # (day, period) -> vars
+    by_td = defaultdict(list)   # (teacher, day) -> (var, duration)
+    by_t = defaultdict(list)    # teacher -> (var, duration)
+    non_major = []              # vars assigning a class to a minor-only teacher
+    for ti, tid in enumerate(teacher_ids):
+        maj, minr = qualifications[tid]["major"], qualifications[tid]["minor"]
+        for ci, cid in enumerate(class_ids):
             subj = class_subject[cid]
-            if subj in qualifications.get(tid, {}).get("major", set()) or subj in qualifications.get(tid, {}).get("minor", set()):
-                for room in rooms:
-                    for d in days:
-                        for per in periods:
-                            if per not in allowed_periods:
-                                continue
-                            for occ in range(class_times[cid]):
-                                # occ is the occurrence index for this class in the week
-                                x[(tid, cid, room, d, per, occ)] = LpVariable(
-                                    f"x_{tid}_{cid}_{room}_{d}_{per}_{occ}", cat=LpBinary)
+            if subj in maj or subj in minr:
+                dur = class_duration[cid]
+                for di in day_range:
+                    for pi in allowed_periods:
+                        var = LpVariable(f"x_{ti}_{ci}_{di}_{pi}", cat=LpBinary)
+                        x[(ti, ci, di, pi)] = var
+                        by_c[ci].append(var)
+                        by_cd[(ci, di)].append(var)
+                        by_tdp[(ti, di, pi)].append(var)
+                        by_dp[(di, pi)].append(var)
+                        by_td[(ti, di)].append((var, dur))
+                        by_t[ti].append((var, dur))
+                        if subj not in maj:
+                            non_major.append(var)
     # Objective: minimize assignments to non-major teachers
-    model += lpSum(
-        (0 if class_subject[c] in qualifications[t]["major"] else 1) * var
-        for (t, c, r, d, p, occ), var in x.items()
-    )
-    # Each class occurrence must be scheduled exactly once (for each times_per_week)
-    for cid, _, times, dur in classes:
-        for occ in range(class_times[cid]):
-            model += lpSum(v for (t, c, r, d, p, o), v in x.items() if c == cid and o == occ) == 1
+    model += lpSum(non_major)
+    # Each class must be scheduled exactly times_per_week times; with spread_week the
+    # meetings are also spread across the week (at most once a day unless the class
+    # meets more often than there are days). This cap can cost optimality or feasibility.
+    for ci, cid in enumerate(class_ids):
+        model += lpSum(by_c[ci]) == class_times[cid]
+        if spread_week:
+            per_day = -(-class_times[cid] // len(days))
+            for di in day_range:
+                model += lpSum(by_cd[(ci, di)]) <= per_day
     # No teacher can be in two places at once
-    for tid, _, _ in teachers:
-        for d in days:
-            for per in periods:
-                model += lpSum(v for (t, c, r, day, p, o), v in x.items() if t == tid and day == d and p == per) <= 1
-    # No room can be double-booked
-    for room in rooms:
-        for d in days:
-            for per in periods:
-                model += lpSum(v for (t, c, r, day, p, o), v in x.items() if r == room and day == d and p == per) <= 1
+    for ti in range(len(teacher_ids)):
+        for di in day_range:
+            for pi in allowed_periods:
+                model += lpSum(by_tdp[(ti, di, pi)]) <= 1
+    # No more classes in a period than there are rooms
+    for di in day_range:
+        for pi in allowed_periods:
+            model += lpSum(by_dp[(di, pi)]) <= len(rooms)
     # Max periods per day/week per teacher (counting durations)
-    for tid, _, _ in teachers:
-        for d in days:
-            model += lpSum(v * class_duration[c] for (t, c, r, day, p, o), v in x.items() if t == tid and day == d) <= max_per_day
-        model += lpSum(v * class_duration[c] for (t, c, r, d, p, o), v in x.items() if t == tid) <= max_per_week
-    model.solve(PULP_CBC_CMD(msg=False))
-    # Build schedule
-    sched = []
-    for (t, c, r, d, p, o), var in x.items():
-        if var.value() == 1:
-            sched.append({
-                "Teacher": t,
-                "Class": c,
-                "Subject": class_subject[c],
-                "Room": r,
-                "Day": d,
-                "Period": p,
-                "Occurrence": o + 1,
-                "Duration": class_duration[c]
-            })
-    return pd.DataFrame(sched)
+    for ti in range(len(teacher_ids)):
+        for di in day_range:
+            model += lpSum(v * dur for v, dur in by_td[(ti, di)]) <= max_per_day
+        model += lpSum(v * dur for v, dur in by_t[ti]) <= max_per_week
+    # Seed the search with a greedy schedule when one exists, giving the solver an
+    # incumbent to prune against from the start
+    greedy = _greedy_assign(teachers, rooms, classes, max_per_day, max_per_week, allowed_periods, spread_week)
+    if greedy:
+        for key, var in x.items():
+            var.setInitialValue(greedy.get(key, 0))
+    warm_start = greedy is not None
+    try:
+        model.solve(make_solver(solver_name, threads, time_limit, gap_rel, warm_start))
+    except PulpSolverError:
+        # e.g. CBC builds without multithread support reject the threads option
+        model.solve(make_solver("CBC", 1, time_limit, gap_rel, warm_start))
+    if model.status != LpStatusOptimal:
+        # Keep the solver's verdict so a solver failure is not reported as infeasibility
+        sched = pd.DataFrame()
+        sched.attrs["status"] = LpStatus[model.status]
+        if spread_week and LpStatus[model.status] == "Infeasible":
+            sched.attrs["infeasible"] = ["The even-spread rule (each class at most once a day) may be why; try turning it off in the Constraints tab."]
+        return sched
+    # Build schedule from the chosen variables, pulling all values out in one pass
+    keys = list(x)
+    vals = np.fromiter((v.varValue or 0 for v in x.values()), dtype=np.float64, count=len(x))
+    picked = np.flatnonzero(vals > 0.5)
+    idx = pd.DataFrame.from_records([keys[i] for i in picked], columns=["t", "c", "d", "p"])
+    if idx.empty:
+        return pd.DataFrame()
+    # In weekly order per class, number occurrences as they come and hand out rooms
+    # in order within each (day, period) slot
+    idx = idx.sort_values(["c", "d", "p"], ignore_index=True)
+    class_arr = np.asarray(class_ids, dtype=object)[idx["c"].to_numpy()]
+    sched = pd.DataFrame({
+        "Teacher": np.asarray(teacher_ids, dtype=object)[idx["t"].to_numpy()],
+        "Class": class_arr,
+        "Subject": [class_subject[c] for c in class_arr],
+        "Room": np.asarray(rooms, dtype=object)[idx.groupby(["d", "p"]).cumcount().to_numpy()],
+        "Day": np.asarray(days, dtype=object)[idx["d"].to_numpy()],
+        "Period": np.asarray(periods, dtype=object)[idx["p"].to_numpy()],
+        "Occurrence": idx.groupby("c").cumcount() + 1,
+        "Duration": [class_duration[c] for c in class_arr],
+    })
+    return sched
 
 # ----------------------------
 # 3. STREAMLIT APP
 # ----------------------------
+def _set_types(df, str_cols, num_cols=()):
+    """
+    Coerce profile columns in place: str_cols to strings, num_cols to numbers
+    (unparseable values become NaN). Called where a profile table is loaded or
+    edited, rather than on every rerun. Returns df.
+    """
+    for col in str_cols:
+        df[col] = df[col].astype(str)
+    for col in num_cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+@st.cache_data(show_spinner=False)
+def _parse_csv(raw_bytes, required):
+    """
+    Parse an uploaded CSV, returning (df, sep, missing). Cached on the raw bytes,
+    so reruns and re-uploads of the same file skip parsing entirely.
+    Comma-separated files take the fast C parser; anything else lets pandas
+    sniff the delimiter (sep is then None). Column names are stripped and lowercased.
+    """
+    first_line = raw_bytes.split(b"\n", 1)[0]
+    sep, engine = (",", "c") if b"," in first_line else (None, "python")
+    try:
+        df = pd.read_csv(io.BytesIO(raw_bytes), sep=sep, engine=engine)
+    except UnicodeDecodeError:
+        df = pd.read_csv(io.BytesIO(raw_bytes), sep=sep, engine=engine, encoding="latin1")
+    df.columns = [c.strip().lower() for c in df.columns]
+    missing = sorted(set(required) - set(df.columns))
+    return df, sep, missing
+
 def main():
     st.title("Teacher and classroom app")
+    _warm_nat_kernel()
     # Initialize state
     if "teachers_df" not in st.session_state:
         st.session_state.teachers_df = pd.DataFrame(columns=["id","major","minor"])
@@ -111,6 +325,16 @@ def main():
         st.session_state.max_per_day = 6
     if "max_per_week" not in st.session_state:
         st.session_state.max_per_week = 30
+    if "spread_week" not in st.session_state:
+        st.session_state.spread_week = True
+    if "solver_name" not in st.session_state:
+        st.session_state.solver_name = "HiGHS"
+    if "solver_threads" not in st.session_state:
+        st.session_state.solver_threads = os.cpu_count() or 1
+    if "solver_time_limit" not in st.session_state:
+        st.session_state.solver_time_limit = 60
+    if "solver_gap_rel" not in st.session_state:
+        st.session_state.solver_gap_rel = 0.01
 
     tabs = st.tabs(["School Profile","Constraints","Scheduler","Diagnostics","SRI & Simulation"])
 
@@ -120,28 +344,14 @@ def main():
         st.subheader("Teacher Data")
         uploaded = st.file_uploader("Upload teachers CSV", type=["csv"], key="teacher_upload")
         if uploaded:
-            raw_bytes = uploaded.getvalue()
-            try: raw = raw_bytes.decode('utf-8')
-            except: raw = raw_bytes.decode('latin1')
-            # detect delimiter
             try:
-                dialect = csv.Sniffer().sniff(raw.splitlines()[0])
-                sep = dialect.delimiter
-            except:
-                sep = ','
-            # peek header
-            try:
-                df_head = pd.read_csv(io.StringIO(raw), sep=sep, nrows=0)
-                cols = [c.strip().lower() for c in df_head.columns]
-                st.info(f"Detected teacher columns (sep='{sep}'): {cols}")
-                missing = set(["id","major","minor"]) - set(cols)
+                df, sep, missing = _parse_csv(uploaded.getvalue(), ("id","major","minor"))
+                st.info(f"Detected teacher columns (sep='{sep or 'auto'}'): {list(df.columns)}")
                 if missing:
                     st.error(f"Missing teacher columns: {', '.join(missing)}")
                 else:
                     if st.button("Proceed with Upload", key="teach_proceed"):
-                        df = pd.read_csv(io.StringIO(raw), sep=sep)
-                        df.columns = [c.strip().lower() for c in df.columns]
-                        st.session_state.teachers_df = df[["id","major","minor"]].drop_duplicates().reset_index(drop=True)
+                        st.session_state.teachers_df = _set_types(df[["id","major","minor"]].drop_duplicates().reset_index(drop=True), ["id","major","minor"])
                         st.success("Teachers loaded.")
             except Exception as e:
                 st.error(f"Error parsing teacher CSV: {e}")
@@ -166,9 +376,8 @@ def main():
                             st.error("Duplicate ID not allowed.")
                         else:
                             idx = teachers_df[teachers_df['id'] == selected_teacher].index[0]
-                            st.session_state.teachers_df.at[idx, 'id'] = t_id
-                            st.session_state.teachers_df.at[idx, 'major'] = t_maj
-                            st.session_state.teachers_df.at[idx, 'minor'] = t_min
+                            st.session_state.teachers_df.loc[idx, ['id','major','minor']] = [t_id, t_maj, t_min]
+                            _set_types(st.session_state.teachers_df, ["id","major","minor"])
                             st.success("Teacher updated.")
                 with col2:
                     if st.form_submit_button("Delete"):
@@ -189,37 +398,21 @@ def main():
                     st.error("Duplicate ID not allowed.")
                 else:
                     df2 = pd.DataFrame([{"id":t_id,"major":t_maj,"minor":t_min}])
-                    st.session_state.teachers_df = pd.concat([teachers_df,df2],ignore_index=True).drop_duplicates().reset_index(drop=True)
+                    st.session_state.teachers_df = _set_types(pd.concat([teachers_df,df2],ignore_index=True).drop_duplicates().reset_index(drop=True), ["id","major","minor"])
                     st.success("Teacher added.")
-        # Ensure consistent types for display
-        st.session_state.teachers_df['id'] = st.session_state.teachers_df['id'].astype(str)
-        st.session_state.teachers_df['major'] = st.session_state.teachers_df['major'].astype(str)
-        st.session_state.teachers_df['minor'] = st.session_state.teachers_df['minor'].astype(str)
         st.dataframe(st.session_state.teachers_df)
 
         st.subheader("Classroom Data")
         uploaded = st.file_uploader("Upload classrooms CSV", type=["csv"], key="room_upload")
         if uploaded:
-            raw_bytes = uploaded.getvalue()
-            try: raw = raw_bytes.decode('utf-8')
-            except: raw = raw_bytes.decode('latin1')
-            try:
-                dialect = csv.Sniffer().sniff(raw.splitlines()[0])
-                sep = dialect.delimiter
-            except:
-                sep = ','
             try:
-                df_head = pd.read_csv(io.StringIO(raw), sep=sep, nrows=0)
-                cols = [c.strip().lower() for c in df_head.columns]
-                st.info(f"Detected room columns (sep='{sep}'): {cols}")
-                missing = set(["id","capacity"]) - set(cols)
+                df, sep, missing = _parse_csv(uploaded.getvalue(), ("id","capacity"))
+                st.info(f"Detected room columns (sep='{sep or 'auto'}'): {list(df.columns)}")
                 if missing:
                     st.error(f"Missing room columns: {', '.join(missing)}")
                 else:
                     if st.button("Proceed with Upload", key="room_proceed"):
-                        df = pd.read_csv(io.StringIO(raw), sep=sep)
-                        df.columns = [c.strip().lower() for c in df.columns]
-                        st.session_state.rooms_df = df[["id","capacity"]].drop_duplicates().reset_index(drop=True)
+                        st.session_state.rooms_df = _set_types(df[["id","capacity"]].drop_duplicates().reset_index(drop=True), ["id"], ["capacity"])
                         st.success("Rooms loaded.")
             except Exception as e:
                 st.error(f"Error parsing room CSV: {e}")
@@ -239,8 +432,8 @@ def main():
                             st.error("Duplicate Room ID not allowed.")
                         else:
                             idx = rooms_df[rooms_df['id'] == selected_room].index[0]
-                            st.session_state.rooms_df.at[idx, 'id'] = r_id
-                            st.session_state.rooms_df.at[idx, 'capacity'] = r_cap
+                            st.session_state.rooms_df.loc[idx, ['id','capacity']] = [r_id, r_cap]
+                            _set_types(st.session_state.rooms_df, ["id"], ["capacity"])
                             st.success("Room updated.")
                 with col2:
                     if st.form_submit_button("Delete"):
@@ -259,36 +452,21 @@ def main():
                     st.error("Duplicate Room ID not allowed.")
                 else:
                     df2 = pd.DataFrame([{"id":r_id,"capacity":r_cap}])
-                    st.session_state.rooms_df = pd.concat([rooms_df,df2],ignore_index=True).drop_duplicates().reset_index(drop=True)
+                    st.session_state.rooms_df = _set_types(pd.concat([rooms_df,df2],ignore_index=True).drop_duplicates().reset_index(drop=True), ["id"], ["capacity"])
                     st.success("Room added.")
-        # Ensure consistent types for display
-        st.session_state.rooms_df['id'] = st.session_state.rooms_df['id'].astype(str)
-        st.session_state.rooms_df['capacity'] = pd.to_numeric(st.session_state.rooms_df['capacity'], errors='coerce')
         st.dataframe(st.session_state.rooms_df)
 
         st.subheader("Subject Data")
         uploaded = st.file_uploader("Upload subjects CSV", type=["csv"], key="subj_upload")
         if uploaded:
-            raw_bytes = uploaded.getvalue()
-            try: raw = raw_bytes.decode('utf-8')
-            except: raw = raw_bytes.decode('latin1')
             try:
-                dialect = csv.Sniffer().sniff(raw.splitlines()[0])
-                sep = dialect.delimiter
-            except:
-                sep = ','
-            try:
-                df_head = pd.read_csv(io.StringIO(raw), sep=sep, nrows=0)
-                cols = [c.strip().lower() for c in df_head.columns]
-                st.info(f"Detected subject columns (sep='{sep}'): {cols}")
-                missing = set(["id","subject","times_per_week","duration"]) - set(cols)
+                df, sep, missing = _parse_csv(uploaded.getvalue(), ("id","subject","times_per_week","duration"))
+                st.info(f"Detected subject columns (sep='{sep or 'auto'}'): {list(df.columns)}")
                 if missing:
                     st.error(f"Missing subject columns: {', '.join(missing)}")
                 else:
                     if st.button("Proceed with Upload", key="subj_proceed"):
-                        df = pd.read_csv(io.StringIO(raw), sep=sep)
-                        df.columns = [c.strip().lower() for c in df.columns]
-                        st.session_state.classes_df = df[["id","subject","times_per_week","duration"]].drop_duplicates().reset_index(drop=True)
+                        st.session_state.classes_df = _set_types(df[["id","subject","times_per_week","duration"]].drop_duplicates().reset_index(drop=True), ["id","subject"], ["times_per_week","duration"])
                         st.success("Subjects loaded.")
             except Exception as e:
                 st.error(f"Error parsing subject CSV: {e}")
@@ -310,10 +488,8 @@ def main():
                             st.error("Duplicate Class ID not allowed.")
                         else:
                             idx = classes_df[classes_df['id'] == selected_class].index[0]
-                            st.session_state.classes_df.at[idx, 'id'] = c_id
-                            st.session_state.classes_df.at[idx, 'subject'] = c_sub
-                            st.session_state.classes_df.at[idx, 'times_per_week'] = c_times
-                            st.session_state.classes_df.at[idx, 'duration'] = c_dur
+                            st.session_state.classes_df.loc[idx, ['id','subject','times_per_week','duration']] = [c_id, c_sub, c_times, c_dur]
+                            _set_types(st.session_state.classes_df, ["id","subject"], ["times_per_week","duration"])
                             st.success("Subject updated.")
                 with col2:
                     if st.form_submit_button("Delete"):
@@ -334,13 +510,8 @@ def main():
                     st.error("Duplicate Class ID not allowed.")
                 else:
                     df2 = pd.DataFrame([{"id":c_id,"subject":c_sub,"times_per_week":c_times,"duration":c_dur}])
-                    st.session_state.classes_df = pd.concat([classes_df,df2],ignore_index=True).drop_duplicates().reset_index(drop=True)
+                    st.session_state.classes_df = _set_types(pd.concat([classes_df,df2],ignore_index=True).drop_duplicates().reset_index(drop=True), ["id","subject"], ["times_per_week","duration"])
                     st.success("Subject added.")
-        # Ensure consistent types for display
-        st.session_state.classes_df['id'] = st.session_state.classes_df['id'].astype(str)
-        st.session_state.classes_df['subject'] = st.session_state.classes_df['subject'].astype(str)
-        st.session_state.classes_df['times_per_week'] = pd.to_numeric(st.session_state.classes_df['times_per_week'], errors='coerce')
-        st.session_state.classes_df['duration'] = pd.to_numeric(st.session_state.classes_df['duration'], errors='coerce')
         st.dataframe(st.session_state.classes_df)
 
     # Constraints Tab
@@ -348,6 +519,7 @@ def main():
         st.header("Scheduling Constraints")
         st.session_state.max_per_day = st.number_input("Max periods per day",min_value=1,max_value=10,value=st.session_state.max_per_day)
         st.session_state.max_per_week = st.number_input("Max periods per week",min_value=1,max_value=50,value=st.session_state.max_per_week)
+        st.session_state.spread_week = st.checkbox("Spread each class across the week",value=st.session_state.spread_week,help="At most one meeting per day for classes that meet 5 times a week or less; turn off if no schedule is found")
         st.session_state.num_shifts = st.selectbox("Number of Shifts", [1,2,3], index=0, help="1=Whole day, 2=Morning/Afternoon, 3=Morning/Afternoon/Evening")
         if st.session_state.num_shifts == 1:
             st.info("Whole day schedule (default)")
@@ -355,6 +527,14 @@ def main():
             st.info("Morning and Afternoon shifts")
         else:
             st.info("Morning, Afternoon, and Evening shifts")
+        st.subheader("Solver Settings")
+        st.session_state.solver_name = st.selectbox("Solver", list(solvers), index=list(solvers).index(st.session_state.solver_name), help="HiGHS and CBC are open source; Gurobi requires a license")
+        if not solvers[st.session_state.solver_name]().available():
+            st.warning(f"{st.session_state.solver_name} is not installed; CBC will be used instead.")
+        highs = st.session_state.solver_name == "HiGHS" and HiGHS().available()
+        st.session_state.solver_threads = st.number_input("Solver threads",min_value=1,max_value=os.cpu_count() or 1,value=st.session_state.solver_threads,disabled=highs,help="HiGHS picks its own thread count" if highs else None)
+        st.session_state.solver_time_limit = st.number_input("Solver time limit (seconds)",min_value=1,max_value=3600,value=st.session_state.solver_time_limit)
+        st.session_state.solver_gap_rel = st.number_input("Relative optimality gap",min_value=0.0,max_value=1.0,value=st.session_state.solver_gap_rel,step=0.01,format="%.3f", help="Stop once the solution is within this fraction of optimal")
 
     # Scheduler Tab
     with tabs[2]:
@@ -368,14 +548,10 @@ def main():
         if st.button("Generate Schedule"):
             start_time = time.perf_counter()
             progress = st.progress(0, text="Generating schedule...")
-            teachers = list(st.session_state.teachers_df.itertuples(index=False, name=None))
-            progress.progress(10, text="Processing teachers...")
-            rooms = st.session_state.rooms_df['id'].tolist()
-            progress.progress(20, text="Processing rooms...")
-            classes = list(st.session_state.classes_df.itertuples(index=False, name=None))
-            progress.progress(30, text="Processing classes...")
+            teachers, rooms, classes = normalize_inputs(st.session_state.teachers_df, st.session_state.rooms_df, st.session_state.classes_df)
+            progress.progress(30, text="Processing teachers, rooms and classes...")
             progress.progress(50, text="Solving optimization problem...")
-            sched = solve_with_pulp(teachers, rooms, classes, st.session_state.max_per_day, st.session_state.max_per_week, st.session_state.num_shifts)
+            sched = solve_with_pulp(teachers, rooms, classes, st.session_state.max_per_day, st.session_state.max_per_week, st.session_state.num_shifts, st.session_state.solver_name, st.session_state.solver_threads, st.session_state.solver_time_limit, st.session_state.solver_gap_rel, st.session_state.spread_week)
             progress.progress(90, text="Building output...")
             st.session_state['last_schedule'] = sched
             elapsed = time.perf_counter() - start_time
@@ -383,8 +559,12 @@ def main():
             time.sleep(0.5)
             progress.empty()
             st.caption(f"Schedule generated in {elapsed:.2f} seconds")
-            if sched.empty:
+            if sched.empty and sched.attrs.get("status") not in (None, "Infeasible"):
+                st.error(f"The solver stopped without a schedule (status: {sched.attrs['status']}). Try a longer time limit or a different solver.")
+            elif sched.empty:
                 st.error("No feasible schedule. Check inputs.")
+                for reason in sched.attrs.get("infeasible", []):
+                    st.error(reason)
             else:
                 st.subheader("Raw Schedule Table")
                 for col in sched.columns:
@@ -410,11 +590,12 @@ def main():
                 for shift_idx, rng in enumerate(shift_period_ranges[st.session_state.num_shifts]):
                     shift_name = shift_labels[st.session_state.num_shifts][shift_idx]
                     shift_periods_list = periods[rng[0]:rng[1]+1]
-                    timetable = pd.DataFrame('', index=shift_periods_list, columns=days)
                     t_sched = sched[(sched['Teacher'] == teacher) & (sched['Period'].isin(shift_periods_list))]
-                    for _, row in t_sched.iterrows():
-                        cell = f"{row['Subject']}\n({row['Class']})\nRoom: {row['Room']}"
-                        timetable.at[row['Period'], row['Day']] = cell
+                    t_sched = t_sched.assign(cell=t_sched['Subject'] + "\n(" + t_sched['Class'] + ")\nRoom: " + t_sched['Room'])
+                    timetable = (t_sched.drop_duplicates(['Period', 'Day'], keep='last')
+                                 .pivot(index='Period', columns='Day', values='cell')
+                                 .reindex(index=shift_periods_list, columns=days)
+                                 .fillna(''))
                     st.markdown(f"*Shift: {shift_name}*")
                     st.dataframe(timetable)
 
@@ -429,23 +610,18 @@ def main():
         if sched.empty:
             st.info("Generate a schedule first to see diagnostics.")
         else:
+            diag = _compute_diagnostics(sched, teachers_df, rooms_df, st.session_state.max_per_week)
+            non_spec, over_teachers, over_rooms = diag["non_spec"], diag["over_teachers"], diag["over_rooms"]
             # 1. Teachers handling non-specialized subjects
-            non_spec = sched[~sched.apply(lambda row: row['Subject'] in teachers_df.set_index('id').loc[row['Teacher'], ['major','minor']].values, axis=1)]
             st.subheader("Constraint Violations")
             st.write(f"Teachers handling non-specialized subjects: {len(non_spec)} assignments")
             if not non_spec.empty:
                 st.dataframe(non_spec)
             # 2. Overscheduled teachers
-            teacher_counts = sched.groupby('Teacher').size()
-            over_teachers = teacher_counts[teacher_counts > st.session_state.max_per_week]
             st.write(f"Overscheduled teachers: {len(over_teachers)}")
             if not over_teachers.empty:
                 st.dataframe(over_teachers)
             # 3. Overloaded classrooms
-            room_counts = sched.groupby('Room').size()
-            room_cap = rooms_df.set_index('id')['capacity']
-            aligned_counts = room_counts.reindex(room_cap.index, fill_value=0)
-            over_rooms = aligned_counts[aligned_counts > room_cap]
             st.write(f"Overloaded classrooms: {len(over_rooms)}")
             if not over_rooms.empty:
                 st.dataframe(over_rooms)
@@ -465,7 +641,7 @@ def main():
                 st.info(f"Undercapacity: More rooms than sections. {total_rooms-total_sections} underutilized.")
             # 5. Impact estimation (simple)
             st.subheader("Estimated Impact on Learning Outcomes")
-            percent_non_spec = 100 * len(non_spec) / len(sched) if len(sched) else 0
+            percent_non_spec = 100 - diag["percent_specialist"]
             if percent_non_spec > 0:
                 st.write(f"{percent_non_spec:.1f}% of assignments handled by non-specialists. Estimated NAT score reduction: ~{percent_non_spec/2:.1f}%")
             # 6. Recommendations
@@ -490,8 +666,7 @@ def main():
                 st.write(f"- {r}")
             # 7. ESF-7-aligned report (basic)
             st.subheader("ESF-7 Summary")
-            esf7 = sched.groupby(['Teacher','Subject']).size().reset_index(name='Assignments')
-            st.dataframe(esf7)
+            st.dataframe(diag["esf7"])
 
     # SRI & Simulation Tab
     with tabs[4]:
@@ -505,76 +680,203 @@ def main():
             st.info("Generate a schedule first to see SRI and run simulations.")
         else:
             # Compute SRI components
-            total_assignments = len(sched)
-            non_spec = sched[~sched.apply(lambda row: row['Subject'] in teachers_df.set_index('id').loc[row['Teacher'], ['major','minor']].values, axis=1)]
-            percent_specialist = 100 * (1 - len(non_spec)/total_assignments) if total_assignments else 0
-            teacher_counts = sched.groupby('Teacher').size()
-            over_teachers = teacher_counts[teacher_counts > st.session_state.max_per_week]
-            percent_overload_teachers = 100 * len(over_teachers) / len(teachers_df) if len(teachers_df) else 0
-            room_counts = sched.groupby('Room').size()
-            room_cap = rooms_df.set_index('id')['capacity']
-            aligned_counts = room_counts.reindex(room_cap.index, fill_value=0)
-            over_rooms = aligned_counts[aligned_counts > room_cap]
-            percent_overload_rooms = 100 * len(over_rooms) / len(rooms_df) if len(rooms_df) else 0
+            diag = _compute_diagnostics(sched, teachers_df, rooms_df, st.session_state.max_per_week)
+            percent_specialist = diag["percent_specialist"]
+            percent_overload_teachers = diag["percent_overload_teachers"]
+            percent_overload_rooms = diag["percent_overload_rooms"]
             unmet_sections = 0 # Placeholder: can be computed if logic for unmet is added
             percent_unmet_sections = 0 # Placeholder
-            sri = compute_sri(percent_specialist, percent_overload_teachers, percent_overload_rooms, percent_unmet_sections)
+            sri = compute_sri_default(percent_specialist, percent_overload_teachers, percent_overload_rooms, percent_unmet_sections)
             st.metric("School Readiness Index (SRI)", f"{sri} / 100")
-            st.caption("SRI weights: Specialist 40%, Teacher Overload 20%, Room Overload 20%, Unmet Sections 20% (adjustable in code)")
+            st.caption(sri_caption)
             st.write(f"Specialist assignments: {percent_specialist:.1f}% | Overloaded teachers: {percent_overload_teachers:.1f}% | Overloaded rooms: {percent_overload_rooms:.1f}% | Unmet sections: {percent_unmet_sections:.1f}%")
             # Simulation UI
             st.subheader("Simulate Policy/Resource Changes and Impact on NAT Score")
-            base_nat = st.number_input("Baseline NAT Score", min_value=0.0, max_value=100.0, value=60.0)
-            class_size = st.number_input("Average Class Size", min_value=1, max_value=100, value=45)
-            pct_nonspec = st.number_input("% Non-Specialist Assignments", min_value=0.0, max_value=100.0, value=100-percent_specialist)
-            pct_overload = st.number_input("% Overloaded Teachers", min_value=0.0, max_value=100.0, value=percent_overload_teachers)
-            n_shifts = st.number_input("Number of Shifts", min_value=1, max_value=3, value=num_shifts)
-            if st.button("Run Simulation"):
+            # Inputs are batched in a form so editing them doesn't rerun the app until submitted
+            with st.form("sim_form"):
+                base_nat = st.number_input("Baseline NAT Score", min_value=0.0, max_value=100.0, value=60.0)
+                class_size = st.number_input("Average Class Size", min_value=1, max_value=100, value=45)
+                pct_nonspec = st.number_input("% Non-Specialist Assignments", min_value=0.0, max_value=100.0, value=100-percent_specialist)
+                pct_overload = st.number_input("% Overloaded Teachers", min_value=0.0, max_value=100.0, value=percent_overload_teachers)
+                n_shifts = st.number_input("Number of Shifts", min_value=1, max_value=3, value=num_shifts)
+                submitted = st.form_submit_button("Run Simulation")
+            if submitted:
                 nat_pred = simulate_nat_score(base_nat, class_size, pct_nonspec, pct_overload, n_shifts)
                 st.success(f"Simulated NAT Score: {nat_pred:.2f}")
                 # Narrative explanation
-                narrative = f"""
-**Simulation Narrative:**
-- **Class size:** For every 5 students above 45, average NAT scores decrease by 1.5 points (Project STAR, World Bank 2016).
-- **Specialization:** Each 10% increase in non-specialist assignments reduces scores by 3 points (Orbeta et al., PIDS 2020).
-- **Teacher overload:** Every 5% increase in overloaded teachers reduces scores by 0.5 points (OECD TALIS, DepEd).
-- **Shifting:** Each shift beyond single reduces NAT by 2 points (PIDS 2019).
+                st.markdown(build_narrative(class_size, pct_nonspec, pct_overload, n_shifts))
+                st.caption(model_caption)
+            with st.expander("Sensitivity heatmap"):
+                # Sweep two inputs over their ranges, holding the others at the values above
+                sweep_axes = {
+                    "Average Class Size": ("class_size", np.arange(20, 101, 5)),
+                    "% Non-Specialist Assignments": ("pct_nonspec", np.arange(0, 101, 5)),
+                    "% Overloaded Teachers": ("pct_overload", np.arange(0, 101, 5)),
+                    "Number of Shifts": ("n_shifts", np.arange(1, 4)),
+                }
+                x_label = st.selectbox("X axis", list(sweep_axes), index=0, key="sens_x")
+                y_label = st.selectbox("Y axis", [a for a in sweep_axes if a != x_label], index=0, key="sens_y")
+                (x_arg, x_vals), (y_arg, y_vals) = sweep_axes[x_label], sweep_axes[y_label]
+                xx, yy = np.meshgrid(x_vals, y_vals)
+                scenario = {"base_nat": base_nat, "class_size": class_size, "pct_nonspec": pct_nonspec, "pct_overload": pct_overload, "n_shifts": n_shifts}
+                scenario[x_arg], scenario[y_arg] = xx, yy
+                nat_grid = simulate_nat_score_batch(**scenario)
+                grid = pd.DataFrame({"x": xx.ravel(), "y": yy.ravel(), "nat": nat_grid.ravel()})
+                st.altair_chart(alt.Chart(grid).mark_rect().encode(
+                    x=alt.X("x:O", title=x_label),
+                    y=alt.Y("y:O", title=y_label, sort="descending"),
+                    color=alt.Color("nat:Q", title="Simulated NAT"),
+                    tooltip=[alt.Tooltip("x:O", title=x_label), alt.Tooltip("y:O", title=y_label), alt.Tooltip("nat:Q", title="Simulated NAT", format=".2f")],
+                ))
 
-**Your scenario:**
-- Average class size: {class_size}
-- % Non-specialist assignments: {pct_nonspec}
-- % Overloaded teachers: {pct_overload}
-- Number of shifts: {n_shifts}
+def non_specialized_assignments(sched, teachers_df):
+    """
+    Return the schedule rows whose subject is neither the teacher's major nor minor.
+    """
+    tmap = teachers_df.drop_duplicates('id').set_index('id')[['major','minor']]
+    merged = sched[['Teacher','Subject']].merge(tmap, left_on='Teacher', right_index=True, how='left')
+    specialized = (merged['Subject'] == merged['major']) | (merged['Subject'] == merged['minor'])
+    return sched[~specialized.values]
 
-**Interpretation:**
-- Increasing class size, non-specialist assignments, teacher overload, or number of shifts will lower the predicted NAT score, based on cited research. Adjust these parameters to see their impact and guide school planning decisions.
-"""
-                st.markdown(narrative)
-                st.caption("Model: Based on Orbeta (2020), World Bank (2016), OECD TALIS (2019), PIDS (2019). See app code for details.")
+@njit(cache=True)
+def _overload_counts(teacher_ids, room_ids, caps, max_per_week):
+    teacher_counts = np.bincount(teacher_ids)
+    room_counts = np.bincount(room_ids, minlength=caps.shape[0])
+    return teacher_counts, teacher_counts > max_per_week, room_counts, room_counts > caps
+
+def overload_counts(sched, rooms_df, max_per_week):
+    """
+    Return (over_teachers, over_rooms): assignment counts for teachers above
+    max_per_week and for rooms above their capacity.
+    """
+    teachers = pd.Categorical(sched['Teacher'])
+    room_cap = rooms_df.set_index('id')['capacity']
+    # A repeated room id is counted once, against its first listed capacity
+    room_cap = room_cap[~room_cap.index.duplicated()]
+    room_ids = pd.Categorical(sched['Room'], categories=room_cap.index).codes
+    teacher_counts, over_t, room_counts, over_r = _overload_counts(
+        teachers.codes.astype(np.int64),
+        room_ids[room_ids >= 0].astype(np.int64),
+        room_cap.to_numpy(dtype=np.float64),
+        max_per_week,
+    )
+    teacher_counts = pd.Series(teacher_counts, index=pd.Index(teachers.categories, name='Teacher'))
+    room_counts = pd.Series(room_counts, index=room_cap.index)
+    return teacher_counts[over_t], room_counts[over_r]
+
+@st.cache_data(show_spinner=False, persist="disk")
+def _compute_diagnostics(sched, teachers_df, rooms_df, max_per_week):
+    """
+    Schedule checks shared by the Diagnostics and SRI tabs. Cached on the inputs,
+    so reruns only recompute after a new schedule is generated or a profile changes.
+    """
+    non_spec = non_specialized_assignments(sched, teachers_df)
+    over_teachers, over_rooms = overload_counts(sched, rooms_df, max_per_week)
+    return {
+        "non_spec": non_spec,
+        "over_teachers": over_teachers,
+        "over_rooms": over_rooms,
+        "percent_specialist": 100 * (1 - len(non_spec)/len(sched)) if len(sched) else 0,
+        "percent_overload_teachers": 100 * len(over_teachers) / len(teachers_df) if len(teachers_df) else 0,
+        "percent_overload_rooms": 100 * len(over_rooms) / len(rooms_df) if len(rooms_df) else 0,
+        "esf7": sched.groupby(['Teacher','Subject']).size().reset_index(name='Assignments'),
+    }
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def build_narrative(class_size, pct_nonspec, pct_overload, n_shifts):
+    """
+    Markdown explanation of the NAT simulation for the given scenario.
+    """
+    return narrative_template.format_map({
+        "class_size": class_size,
+        "pct_nonspec": pct_nonspec,
+        "pct_overload": pct_overload,
+        "n_shifts": n_shifts,
+    })
 
+@st.cache_data(ttl=3600, show_spinner=False)
 def compute_sri(percent_specialist, percent_overload_teachers, percent_overload_rooms, percent_unmet_sections, w1=0.4, w2=0.2, w3=0.2, w4=0.2):
     """
     Compute School Readiness Index (SRI) on a 0-100 scale.
     All inputs are percentages (0-100).
     Weights can be adjusted as needed.
+    Inputs may also be arrays of scenarios, which are stacked into a (4, N)
+    matrix and scored with a single dot product.
     """
-    sri = (
-        w1 * percent_specialist +
-        w2 * (100 - percent_overload_teachers) +
-        w3 * (100 - percent_overload_rooms) +
-        w4 * (100 - percent_unmet_sections)
-    )
-    return round(sri, 2)
+    weights = np.array([w1, w2, w3, w4], dtype=np.float64)
+    components = np.stack(np.broadcast_arrays(
+        np.asarray(percent_specialist, dtype=np.float64),
+        100.0 - np.asarray(percent_overload_teachers, dtype=np.float64),
+        100.0 - np.asarray(percent_overload_rooms, dtype=np.float64),
+        100.0 - np.asarray(percent_unmet_sections, dtype=np.float64),
+    ))
+    sri = weights @ components.reshape(4, -1)
+    if components.ndim == 1:
+        return round(float(sri[0]), 2)
+    return np.round(sri.reshape(components.shape[1:]), 2)
 
+def compute_sri_default(percent_specialist, percent_overload_teachers, percent_overload_rooms, percent_unmet_sections):
+    """
+    compute_sri with the default weights (0.4, 0.2, 0.2, 0.2) folded in:
+    0.2 * (100 - a) + 0.2 * (100 - b) + 0.2 * (100 - c) == 60 - 0.2 * (a + b + c).
+    """
+    return round(0.4 * percent_specialist + 60 - 0.2 * (percent_overload_teachers + percent_overload_rooms + percent_unmet_sections), 2)
+
+@st.cache_data(ttl=3600, show_spinner=False)
 def simulate_nat_score(base_nat=60, class_size=45, pct_nonspec=0, pct_overload=0, n_shifts=1):
-    nat = base_nat
-    if class_size > 45:
-        nat -= ((class_size - 45) / 5) * 1.5
-    nat -= (pct_nonspec / 10) * 3
-    nat -= (pct_overload / 5) * 0.5
-    if n_shifts > 1:
-        nat -= (n_shifts - 1) * 2
-    return max(nat, 0)
+    """
+    Predict the NAT score for a scenario. Inputs may be scalars or NumPy arrays,
+    which are broadcast together so whole grids of scenarios evaluate in one pass;
+    all-scalar inputs return a float.
+    """
+    features = np.stack(np.broadcast_arrays(
+        np.maximum(np.asarray(class_size, dtype=np.float64) - 45, 0),
+        np.asarray(pct_nonspec, dtype=np.float64),
+        np.asarray(pct_overload, dtype=np.float64),
+        np.maximum(np.asarray(n_shifts, dtype=np.float64) - 1, 0),
+    ))
+    nat = np.asarray(base_nat, dtype=np.float64) + (_nat_model() @ features.reshape(4, -1)).reshape(features.shape[1:])
+    nat = np.clip(nat, 0, None)
+    return float(nat) if nat.ndim == 0 else nat
+
+@st.cache_resource(show_spinner=False)
+def _nat_model():
+    """
+    Coefficients of the NAT model, applied to (students above 45, % non-specialist,
+    % overloaded teachers, extra shifts): 1.5 per 5 students, 3 per 10%,
+    0.5 per 5% and 2 per shift, from the studies cited in the narrative.
+    """
+    coef = np.array([-0.3, -0.3, -0.1, -2.0], dtype=np.float64)
+    coef.setflags(write=False)
+    return coef
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _simulate_nat_vec(base_nat, class_size, pct_nonspec, pct_overload, n_shifts, coef, out):
+    # Same features and coefficients as simulate_nat_score, one scenario per iteration
+    for i in prange(out.shape[0]):
+        over = max(class_size[i] - 45, 0.0)
+        shifts = max(n_shifts[i] - 1, 0.0)
+        nat = base_nat[i] + over * coef[0] + pct_nonspec[i] * coef[1] + pct_overload[i] * coef[2] + shifts * coef[3]
+        out[i] = max(nat, 0.0)
+
+def simulate_nat_score_batch(base_nat, class_size, pct_nonspec, pct_overload, n_shifts):
+    """
+    simulate_nat_score for large batches of scenarios (e.g. Monte-Carlo draws),
+    run through the parallel Numba kernel. Inputs are broadcast together and the
+    result has their common shape.
+    """
+    arrays = np.broadcast_arrays(base_nat, class_size, pct_nonspec, pct_overload, n_shifts)
+    flat = [np.ascontiguousarray(a, dtype=np.float64).ravel() for a in arrays]
+    out = np.empty_like(flat[1])
+    _simulate_nat_vec(*flat, _nat_model(), out)
+    return out.reshape(arrays[0].shape)
+
+@st.cache_resource(show_spinner=False)
+def _warm_nat_kernel():
+    # Compile the kernel once per process rather than on the first simulation
+    one = np.ones(1)
+    _simulate_nat_vec(one, one, one, one, one, _nat_model(), np.empty(1))
+    return True
 
 if __name__ == "__main__":
     main()
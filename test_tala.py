@@ -0,0 +1,43 @@
+import itertools
+
+import numpy as np
+
+import tala
+
+def reference_nat_score(base_nat=60, class_size=45, pct_nonspec=0, pct_overload=0, n_shifts=1):
+    # The original, unfolded NAT model that simulate_nat_score must reproduce
+    nat = base_nat
+    if class_size > 45:
+        nat -= ((class_size - 45) / 5) * 1.5
+    nat -= (pct_nonspec / 10) * 3
+    nat -= (pct_overload / 5) * 0.5
+    if n_shifts > 1:
+        nat -= (n_shifts - 1) * 2
+    return max(nat, 0)
+
+# Percentages 0..100 in steps of 5 on each axis
+percentages = np.arange(0, 101, 5, dtype=np.float64)
+
+def test_compute_sri_default_matches_compute_sri():
+    grid = np.array(list(itertools.product(percentages, repeat=4)))
+    folded = np.array([tala.compute_sri_default(*row) for row in grid])
+    np.testing.assert_allclose(folded, tala.compute_sri(*grid.T), rtol=0, atol=1e-9)
+
+# Folding the constants (x / 5 * 1.5 -> x * 0.3, ...) changes the rounding, so
+# parity with the reference is checked to within 1e-9 rather than bit for bit
+def nat_grid():
+    return np.array(list(itertools.product(
+        [0.0, 40.0, 60.0, 100.0], np.arange(1, 101, 3, dtype=np.float64),
+        percentages, percentages, [1.0, 2.0, 3.0])))
+
+def test_simulate_nat_score_matches_reference():
+    grid = nat_grid()
+    expected = np.array([reference_nat_score(*row) for row in grid])
+    np.testing.assert_allclose(tala.simulate_nat_score(*grid.T), expected, rtol=0, atol=1e-9)
+    for row in grid[::997]:
+        assert abs(tala.simulate_nat_score(*row) - reference_nat_score(*row)) <= 1e-9
+
+def test_simulate_nat_score_batch_matches_reference():
+    grid = nat_grid()
+    expected = np.array([reference_nat_score(*row) for row in grid])
+    np.testing.assert_allclose(tala.simulate_nat_score_batch(*grid.T), expected, rtol=0, atol=1e-9)